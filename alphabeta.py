@@ -1,92 +1,242 @@
 from __future__ import annotations
 
 import datetime
+import io
+import itertools
+import mmap
+import os
 import subprocess
-from array import array
-from dataclasses import dataclass
+from collections import deque
+from dataclasses import dataclass, field
 
+import numpy as np
+from llvmlite import ir
+from numba import njit
+from numba.extending import intrinsic
+from numba.types import int64, uint64
 
-class TT49x8RobinHood:
+# Bucket layout constants shared by the jitted kernels (see TT49x8Bucketed).
+_KEY_MASK = np.uint64((1 << 50) - 1)
+_VAL_SHIFT = np.uint64(50)
+
+BUCKET_SLOTS = 7
+BUCKET_WORDS = BUCKET_SLOTS + 1  # tag word + entries = 64 bytes = one cache line
+
+_TAG_LSB = np.uint64(0x0001010101010101)  # bit 0 of tag bytes 0..6
+_TAG_MSB = np.uint64(0x0080808080808080)  # bit 7 of tag bytes 0..6 (occupied flags)
+
+# Returned by tt_get on a miss (values are 14-bit, so this can never be a stored value).
+TT_MISS = np.uint64(1 << 14)
+
+
+@njit(uint64(uint64), cache=True)
+def _hash64(x):
+    """
+    Multiply-fold hash (fxhash-style): one multiply, then fold the high half into
+    the low half. The high bits (bucket index via fastrange) depend on every key
+    bit; the fold spreads that into the low bits used for the tag. Buckets fill as
+    evenly as with SplitMix64 on board49 keys, at a fraction of the cost.
+    uint64 arithmetic wraps natively.
+    """
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    return x ^ (x >> np.uint64(32))
+
+
+@intrinsic
+def _mulhi64(typingctx, a, b):
+    """High 64 bits of the full 128-bit product a * b (a single mul on x86-64)."""
+    sig = uint64(uint64, uint64)
+
+    def codegen(context, builder, signature, args):
+        i128 = ir.IntType(128)
+        prod = builder.mul(builder.zext(args[0], i128), builder.zext(args[1], i128))
+        return builder.trunc(builder.lshr(prod, ir.Constant(i128, 64)), ir.IntType(64))
+
+    return sig, codegen
+
+
+@intrinsic
+def _ctz64(typingctx, x):
+    """Count trailing zeros (a single tzcnt/bsf on x86-64)."""
+    sig = uint64(uint64)
+
+    def codegen(context, builder, signature, args):
+        return builder.cttz(args[0], ir.Constant(ir.IntType(1), 0))
+
+    return sig, codegen
+
+
+@njit(int64(uint64, int64), cache=True)
+def _home(h, nbuckets):
+    # bucket count is arbitrary => map the hash onto [0, nbuckets) with Lemire's
+    # fastrange (multiply-high) instead of a 64-bit modulo
+    return np.int64(_mulhi64(h, np.uint64(nbuckets)))
+
+
+@njit(uint64(uint64), cache=True)
+def _tag(h):
+    # low 7 hash bits (fastrange consumes the high ones) plus the occupied flag
+    return (h & np.uint64(0x7F)) | np.uint64(0x80)
+
+
+@njit(uint64(uint64, uint64), cache=True)
+def _match_tags(tags, tag):
     """
-    Robin Hood hashing, open addressing, no deletes.
+    SWAR byte compare: bit 7 of byte j is set if tag byte j may equal `tag`.
+    May report false positives (borrow propagation), never false negatives;
+    callers confirm every candidate against the full key.
+    """
+    x = tags ^ (tag * _TAG_LSB)
+    return (x - _TAG_LSB) & ~x & _TAG_MSB
+
+
+@njit(uint64(uint64[:, ::1], int64, uint64), cache=True, boundscheck=False)
+def tt_get(buckets, nbuckets, key):
+    """Bucketed lookup. Returns the stored value, or TT_MISS if key is absent."""
+    kp = key + np.uint64(1)
+    h = _hash64(kp)
+    tag = _tag(h)
+
+    b = _home(h, nbuckets)
+    for _ in range(nbuckets):
+        tags = buckets[b, 0]
+        m = _match_tags(tags, tag)
+        while m != np.uint64(0):
+            e = buckets[b, 1 + np.int64(_ctz64(m) >> np.uint64(3))]
+            if (e & _KEY_MASK) == kp:
+                return e >> _VAL_SHIFT
+            m &= m - np.uint64(1)
+
+        # no deletes => a key only spills past its bucket once the bucket is full
+        if (tags & _TAG_MSB) != _TAG_MSB:
+            return TT_MISS
+
+        b += 1
+        if b == nbuckets:
+            b = 0
+
+    return TT_MISS
+
+
+@njit(int64(uint64[:, ::1], int64, uint64, uint64), cache=True, boundscheck=False)
+def tt_set(buckets, nbuckets, key, value):
+    """Bucketed insert/update. Returns 1 if a new key was inserted, else 0."""
+    kp = key + np.uint64(1)
+    entry = kp | (value << _VAL_SHIFT)
+    h = _hash64(kp)
+    tag = _tag(h)
+
+    b = _home(h, nbuckets)
+    for _ in range(nbuckets):
+        tags = buckets[b, 0]
+        m = _match_tags(tags, tag)
+        while m != np.uint64(0):
+            j = 1 + np.int64(_ctz64(m) >> np.uint64(3))
+            if (buckets[b, j] & _KEY_MASK) == kp:
+                # update in place
+                buckets[b, j] = entry
+                return 0
+            m &= m - np.uint64(1)
+
+        empty = ~tags & _TAG_MSB
+        if empty != np.uint64(0):
+            # first free entry of the bucket
+            shift = _ctz64(empty) - np.uint64(7)
+            buckets[b, 0] = tags | (tag << shift)
+            buckets[b, 1 + np.int64(shift >> np.uint64(3))] = entry
+            return 1
+
+        b += 1
+        if b == nbuckets:
+            b = 0
+
+    return 0
+
+
+@njit(int64(uint64[:, ::1], uint64[:, ::1], int64), cache=True, boundscheck=False)
+def _tt_rehash(old, new, nbuckets):
+    """Insert every entry of bucket array `old` into `new`. Returns the count."""
+    n = 0
+    for b in range(old.shape[0]):
+        for j in range(1, BUCKET_WORDS):
+            e = old[b, j]
+            if e != np.uint64(0):
+                key = (e & _KEY_MASK) - np.uint64(1)
+                n += tt_set(new, nbuckets, key, e >> _VAL_SHIFT)
+    return n
+
+
+class TT49x8Bucketed:
+    """
+    F14-style bucketed hashing, open addressing over buckets, no deletes.
     key: 49-bit unsigned (0 .. 2^49-1)
     value: 14-bit unsigned (0 .. 16383)
-    capacity: any positive integer (not necessarily power-of-two)
+    capacity: initial entry count, any positive integer (rounded up to whole buckets);
+              doubled (with a full rehash) once size exceeds MAX_LOAD * capacity
+
+    Bucket layout (8 x uint64 = one 64-byte cache line):
+      word 0      : tag bytes 0..6, one per entry (0 means empty, occupied tags have bit 7 set)
+      words 1..7  : entries, key_plus = key + 1 in bits 0..49, value in bits 50..63
 
-    Slot layout (uint64):
-      bits 0..49  : key_plus = key + 1   (0 means empty)
-      bits 50..63 : value (14-bit)
+    The key's hash selects a home bucket (fastrange over the high bits) and a 7-bit tag
+    (the low bits). A probe compares the tag against all seven tag bytes at once and only
+    reads entries whose tag matches. A full bucket spills into the next one.
 
-    NOTE:
-      We do not store DIB in-slot; we recompute incumbent DIB by re-hashing its key.
-      This keeps packing compact and capacity arbitrary, at the cost of extra hashing.
+    The probe loops live in the module-level @njit kernels tt_get / tt_set, which
+    operate directly on the numpy bucket array; the hot path in search() calls them
+    without going through this class. get / set are range-checked convenience wrappers.
+
+    grow() replaces `buckets` / `num_buckets`, so callers that keep local references
+    to them (search() does) must re-read both after it.
+
+    The bucket array lives in an anonymous mmap: pages are only backed once written,
+    and advise_sequential() lets the kernel read ahead for a full front-to-back scan.
     """
 
     KEY_BITS = 50
     KEY_MASK = (1 << KEY_BITS) - 1
     VAL_SHIFT = KEY_BITS
     KEY_MAX = (1 << 49) - 1
+    MAX_LOAD = 0.75
 
     def __init__(self, capacity: int):
         if capacity <= 0:
             raise ValueError("capacity must be positive")
-        self.cap = int(capacity)
-        self.slots = array("Q", [0]) * self.cap
+        self._allocate(-(-int(capacity) // BUCKET_SLOTS))
         self.size = 0
 
-    @staticmethod
-    def _hash64(x: int) -> int:
-        """
-        SplitMix64-ish mixing for 64-bit keys.
-        Deterministic, fast, good distribution.
-        """
-        x &= (1 << 64) - 1
-        x = (x + 0x9E3779B97F4A7C15) & ((1 << 64) - 1)
-        x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & ((1 << 64) - 1)
-        x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & ((1 << 64) - 1)
-        return x ^ (x >> 31)
-
-    def _home(self, key_plus: int) -> int:
-        # capacity is arbitrary => use modulo
-        return self._hash64(key_plus) % self.cap
-
-    def _dist(self, idx: int, home: int) -> int:
-        # modular distance from home to idx in [0, cap)
-        if idx >= home:
-            return idx - home
-        return idx + self.cap - home
-
-    def get(self, key: int) -> int | None:
-        if key < 0 or key > self.KEY_MAX:
-            raise ValueError("key out of 49-bit range")
-        kp = key + 1
-        cap = self.cap
-        slots = self.slots
-
-        i = self._home(kp)
-        dib = 0
-
-        while dib < cap:
-            e = slots[i]
-            if e == 0:
-                return None
+    def _allocate(self, num_buckets: int) -> None:
+        self.num_buckets = num_buckets
+        self.cap = num_buckets * BUCKET_SLOTS
+        self.grow_at = int(self.cap * self.MAX_LOAD)
+        self._mm = mmap.mmap(-1, num_buckets * BUCKET_WORDS * 8)
+        self.buckets = np.frombuffer(self._mm, dtype=np.uint64).reshape(
+            num_buckets, BUCKET_WORDS
+        )
 
-            ekp = e & self.KEY_MASK
-            if ekp == kp:
-                return e >> self.VAL_SHIFT
+    def grow(self) -> None:
+        """Double the capacity and rehash every entry into the new buckets."""
+        old = self.buckets
+        self._allocate(self.num_buckets * 2)
+        self.size = _tt_rehash(old, self.buckets, self.num_buckets)
 
-            # Robin Hood early-exit condition: if incumbent's DIB < our DIB, key is not present
-            inc_home = self._home(ekp)
-            inc_dib = self._dist(i, inc_home)
-            if inc_dib < dib:
-                return None
+    def entries(self) -> np.ndarray:
+        """All occupied entry words (key_plus | value << 50), as a 1-D uint64 array."""
+        words = self.buckets[:, 1:]
+        return words[words != 0]
 
-            i += 1
-            if i == cap:
-                i = 0
-            dib += 1
+    def advise_sequential(self) -> None:
+        """Hint that the buckets will now be read once, front to back."""
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            self._mm.madvise(mmap.MADV_SEQUENTIAL)
 
-        return None
+    def get(self, key: int) -> int | None:
+        if key < 0 or key > self.KEY_MAX:
+            raise ValueError("key out of 49-bit range")
+        v = tt_get(self.buckets, self.num_buckets, key)
+        if v == TT_MISS:
+            return None
+        return int(v)
 
     def set(self, key: int, value: int) -> None:
         if key < 0 or key > self.KEY_MAX:
@@ -94,50 +244,40 @@ class TT49x8RobinHood:
         if value < 0 or value >= (1 << 14):
             print(f"value={value} {bin(value)}")
             raise ValueError("value out of 14-bit range")
+        self.size += tt_set(self.buckets, self.num_buckets, key, value)
+        if self.size > self.grow_at:
+            self.grow()
 
-        kp = key + 1
-        entry = kp | (int(value) << self.VAL_SHIFT)
-
-        cap = self.cap
-        slots = self.slots
-
-        i = self._home(kp)
-        dib = 0
 
-        while dib < cap:
-            e = slots[i]
-            if e == 0:
-                slots[i] = entry
-                self.size += 1
-                return
+@dataclass
+class WdlServer:
+    """
+    Client for `wdl.out --server --compact`.
 
-            ekp = e & self.KEY_MASK
-            if ekp == kp:
-                # update in place
-                slots[i] = entry
-                return
+    Move sequences are ASCII digit bytes (b"3333332"). An answer is returned as (terminal, present_mask, values_packed):
+      present_mask  : bit c is set iff column c is a legal move
+      values_packed : bits 2c..2c+1 hold WDL(c) + 1 (0/1/2 for -1/0/1; 0 if illegal)
 
-            # Compute incumbent DIB
-            inc_home = self._home(ekp)
-            inc_dib = self._dist(i, inc_home)
+    Queries can be pipelined: prefetch() sends lines without waiting, and the
+    answers are read back (in order) by later query() calls. Answers read while
+    looking for a different sequence are kept in a small cache keyed by move
+    sequence, so the server works ahead while the caller is busy.
+    """
 
-            # Robin Hood rule: steal from the rich (smaller DIB)
-            if inc_dib < dib:
-                # swap: place our entry here, keep probing with displaced entry
-                slots[i], entry = entry, e
-                dib = inc_dib  # displaced entry's DIB at this index
-                # after moving one step forward, its DIB increases by 1
-                # (we'll do dib += 1 at the end of the loop)
+    proc: subprocess.Popen[bytes]
+    reader: io.BufferedReader
+    pending: deque[bytes] = field(default_factory=deque)
+    cache: dict[bytes, tuple[bool, int, int]] = field(default_factory=dict)
 
-            i += 1
-            if i == cap:
-                i = 0
-            dib += 1
+    # Bound on sent-but-unread queries; keeps both pipes well below their buffer
+    # size so the server can never block on a full stdout while we block on stdin.
+    MAX_PENDING = 1024
+    # Bound on cached answers (oldest evicted first); a miss just re-queries.
+    MAX_CACHED = 4096
 
-
-@dataclass
-class WdlServer:
-    proc: subprocess.Popen[str]
+    # Parsed answers keyed by the raw line. The server can only print a few
+    # thousand distinct lines, so after warm-up parsing is a single dict lookup.
+    _parsed_lines = {}  # dict[bytes, tuple[bool, int, int]]
 
     @classmethod
     def start(
@@ -156,50 +296,94 @@ class WdlServer:
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
+            bufsize=0,
         )
         assert proc.stdin is not None
         assert proc.stdout is not None
-        return cls(proc=proc)
+        # unbuffered pipes: queries go out with os.write (no flush), answers are
+        # read through one large buffer so a readline rarely needs a syscall
+        return cls(proc=proc, reader=io.BufferedReader(proc.stdout, 65536))
 
     @staticmethod
-    def _parse_compact_line(line: str) -> tuple[bool, list[int | None]]:
-        toks = line.strip().split()
+    def _parse_compact_line(line: bytes) -> tuple[bool, int, int]:
+        toks = line.split()
         if len(toks) != 8:
             raise ValueError(f"bad token count: {len(toks)} in {line!r}")
-        if toks[0] not in ("0", "1"):
+        if toks[0] not in (b"0", b"1"):
             raise ValueError(f"bad terminal flag: {toks[0]!r} in {line!r}")
-        terminal = toks[0] == "1"
-        vals: list[int | None] = []
-        for t in toks[1:]:
-            vals.append(None if t == "." else int(t))
-        return terminal, vals
+        terminal = toks[0] == b"1"
+        present = 0
+        values = 0
+        for col, t in enumerate(toks[1:]):
+            if t == b".":
+                continue
+            if t not in (b"-1", b"0", b"1"):
+                raise ValueError(f"bad value: {t!r} in {line!r}")
+            present |= 1 << col
+            values |= (int(t) + 1) << (2 * col)
+        return terminal, present, values
 
-    def query(self, move_seq: str) -> tuple[bool, list[int | None]]:
+    def _send(self, data: bytes) -> None:
         assert self.proc.stdin is not None
-        assert self.proc.stdout is not None
 
-        self.proc.stdin.write(move_seq + "\n")
-        self.proc.stdin.flush()
+        fd = self.proc.stdin.fileno()
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view) :]
 
+    def _read_answer(self) -> tuple[bool, int, int]:
         while True:
-            line = self.proc.stdout.readline()
-            if line == "":
+            line = self.reader.readline()
+            answer = self._parsed_lines.get(line)
+            if answer is not None:
+                return answer
+
+            if line == b"":
                 stderr = ""
                 if self.proc.stderr is not None:
-                    stderr = self.proc.stderr.read()
+                    stderr = self.proc.stderr.read().decode(errors="replace")
                 raise RuntimeError(
                     f"wdl server terminated unexpectedly. stderr:\n{stderr}"
                 )
 
-            s = line.strip()
-            if not s:
-                continue
+            toks = line.split()
+            if len(toks) == 8 and toks[0] in (b"0", b"1"):
+                answer = WdlServer._parse_compact_line(line)
+                self._parsed_lines[line] = answer
+                return answer
 
-            toks = s.split()
-            if len(toks) == 8 and toks[0] in ("0", "1"):
-                return WdlServer._parse_compact_line(s)
+    def prefetch(self, move_seqs: list[bytes]) -> None:
+        """
+        Send queries without reading their answers. Skipped (the later query()
+        calls then just ask again) if it would exceed MAX_PENDING.
+        """
+        if not move_seqs or len(self.pending) + len(move_seqs) > self.MAX_PENDING:
+            return
+        self._send(b"\n".join(move_seqs) + b"\n")
+        self.pending.extend(move_seqs)
+
+    def query(self, move_seq: bytes) -> tuple[bool, int, int]:
+        cached = self.cache.pop(move_seq, None)
+        if cached is not None:
+            return cached
+
+        # drain outstanding answers in order, keeping those for other sequences
+        while self.pending:
+            seq = self.pending.popleft()
+            answer = self._read_answer()
+            if seq == move_seq:
+                return answer
+            self.cache[seq] = answer
+            if len(self.cache) > self.MAX_CACHED:
+                del self.cache[next(iter(self.cache))]
+
+        self._send(move_seq + b"\n")
+        return self._read_answer()
+
+    def query_many(self, move_seqs: list[bytes]) -> list[tuple[bool, int, int]]:
+        """Query a batch with a single write; answers are returned in order."""
+        self.prefetch(move_seqs)
+        return [self.query(seq) for seq in move_seqs]
 
     def close(self) -> None:
         if self.proc.stdin is not None:
@@ -217,6 +401,61 @@ class WdlServer:
             self.proc.wait(timeout=5)
 
 
+@dataclass
+class WdlServerPool:
+    """
+    Several WdlServer processes behind the same query interface.
+
+    A query goes to the server picked by its last move, so the siblings that
+    search() prefetches together land on different servers and are evaluated in
+    parallel, while the search itself stays sequential (and its results
+    deterministic). Each process maps the solution files on its own; with
+    use_in_memory=True every server holds a full copy.
+    """
+
+    servers: list[WdlServer]
+
+    @classmethod
+    def start(cls, num_servers: int, **kwargs) -> "WdlServerPool":
+        return cls(servers=[WdlServer.start(**kwargs) for _ in range(num_servers)])
+
+    def _index(self, move_seq: bytes) -> int:
+        return move_seq[-1] % len(self.servers) if move_seq else 0
+
+    def prefetch(self, move_seqs: list[bytes]) -> None:
+        by_server: dict[int, list[bytes]] = {}
+        for seq in move_seqs:
+            by_server.setdefault(self._index(seq), []).append(seq)
+        for i, seq_group in by_server.items():
+            self.servers[i].prefetch(seq_group)
+
+    def query(self, move_seq: bytes) -> tuple[bool, int, int]:
+        return self.servers[self._index(move_seq)].query(move_seq)
+
+    def query_many(self, move_seqs: list[bytes]) -> list[tuple[bool, int, int]]:
+        self.prefetch(move_seqs)
+        return [self.query(seq) for seq in move_seqs]
+
+    def close(self) -> None:
+        for server in self.servers:
+            server.close()
+
+
+def wdl_of(values: int, col: int) -> int:
+    """WDL value of legal column `col` in a packed answer (see WdlServer)."""
+    return ((values >> (2 * col)) & 3) - 1
+
+
+def wdl_max(values: int) -> int:
+    """
+    Best WDL value over the legal columns of a packed answer (-1 if none).
+
+    Codes are 0/1/2 and illegal columns hold 0, so the max is 1 iff some high
+    bit is set, else 0 iff anything is set, else -1. No per-column loop needed.
+    """
+    return ((values & 0x2AAA) != 0) + (values != 0) - 1
+
+
 def moveseq_to_board_42(moveseq: str, width: int = 7, height: int = 6) -> str:
     """
     Convert a connect4 move sequence (string of digits) into a 42-char board string.
@@ -350,106 +589,262 @@ def moveseq_to_board49(moveseq: str, width: int = 7, height: int = 6) -> int:
     return board49
 
 
-srv = WdlServer.start(
-    wdl_bin="./wdl.out", solution_dir="solution_w7_h6", use_in_memory=False
+def board49_play(board49: int, col: int, ply: int) -> int:
+    """
+    Return the board49 encoding after the stone of ply `ply` is dropped into `col`
+    ('x' on even ply, 'o' on odd ply). The column must not be full (not checked).
+
+    With h stones in the column, col_code = (2^h - 1) + pattern. The new stone has
+    bit s (0 for 'x', 1 for 'o') at position h, so the new code is
+      (2^(h+1) - 1) + (pattern | s << h) = col_code + ((1 + s) << h),
+    i.e. a single add on board49. h is read back from col_code itself.
+    """
+    h = (((board49 >> (7 * col)) & 0x7F) + 1).bit_length() - 1
+    return board49 + ((1 + (ply & 1)) << (7 * col + h))
+
+
+# COLUMN_HEIGHT[col_code] = h, the number of stones in a column with that 7-bit code
+COLUMN_HEIGHT = np.array([(c + 1).bit_length() - 1 for c in range(128)], dtype=np.uint8)
+
+
+def board49_depths(boards: np.ndarray) -> np.ndarray:
+    """
+    Number of stones (= ply) of every board49 in a uint64 array: the sum of the
+    per-column heights, looked up in COLUMN_HEIGHT one column at a time.
+    """
+    depths = np.zeros(len(boards), dtype=np.uint8)
+    for col in range(7):
+        depths += COLUMN_HEIGHT[(boards >> np.uint64(7 * col)) & np.uint64(0x7F)]
+    return depths
+
+
+# one server per column at most: siblings are spread over servers by their last move
+srv = WdlServerPool.start(
+    min(7, os.cpu_count() or 1),
+    wdl_bin="./wdl.out",
+    solution_dir="solution_w7_h6",
+    use_in_memory=False,
 )
-srv.query("")
+srv.query(b"")
 
-TRANSPOSITION_TABLE = TT49x8RobinHood(capacity=(1 << 33) + (1 << 32))
+TRANSPOSITION_TABLE = TT49x8Bucketed(capacity=1 << 27)
 
 MOVE_ORDERING = [3, 2, 4, 1, 5, 0, 6]
 
+# DIGIT_BYTES[move] is the move as it appears in a move sequence (b"0" .. b"6")
+DIGIT_BYTES = [bytes((48 + move,)) for move in range(7)]
+
+
+def _ordered_children(present: int, values: int) -> tuple[int, tuple[int, ...]]:
+    """
+    (value, children) for a non-terminal packed answer: value is the best WDL,
+    children are the legal moves to visit, the first MOVE_ORDERING move that
+    achieves value first, then the remaining legal moves in MOVE_ORDERING order.
+    """
+    value = wdl_max(values)
+    for move in MOVE_ORDERING:
+        if (present >> move) & 1 and wdl_of(values, move) == value:
+            first_move = move
+            break
+    others = [m for m in MOVE_ORDERING if m != first_move and (present >> m) & 1]
+    return value, (first_move, *others)
+
+
+def _build_ordered_children() -> dict[int, tuple[int, tuple[int, ...]]]:
+    """_ordered_children for every possible answer, keyed by (present << 14) | values."""
+    table = {}
+    for present in range(1, 1 << 7):
+        cols = [col for col in range(7) if (present >> col) & 1]
+        for codes in itertools.product(range(3), repeat=len(cols)):
+            values = sum(code << (2 * col) for col, code in zip(cols, codes))
+            table[(present << 14) | values] = _ordered_children(present, values)
+    return table
+
 
-def search(moveseq: str, alpha: int, beta: int) -> int:
-    board = moveseq_to_board49(moveseq)
+# search() picks a node's value and children with one lookup here instead of
+# scanning MOVE_ORDERING.
+ORDERED_CHILDREN = _build_ordered_children()
 
-    lb = -1
-    ub = 1
 
-    tt_value = TRANSPOSITION_TABLE.get(board)
-    if tt_value is not None:
-        lb = (tt_value % 16) - 1
-        ub = (tt_value // 16) - 1
-        if lb >= beta:
-            return lb
-        if ub <= alpha:
-            return ub
-        alpha = max(alpha, lb)
-        beta = min(beta, ub)
+MAX_PLY = 42
 
-    is_terminal, wdl_list = srv.query(moveseq)
+# Cross-check every child's value against the oracle's (slow; for debugging).
+DEBUG = False
 
-    if is_terminal:
-        if len(moveseq) == 42:
-            _, _wdl_list = srv.query(moveseq[:-1])
-            if max(x for x in _wdl_list if x is not None) == 1:
-                value = -1
+
+def search(moveseq: bytes, board: int, alpha: int, beta: int) -> int:
+    """
+    `moveseq` holds the root's moves as ASCII digits; the search extends it in a
+    single bytearray, appending a move when descending and popping it when the
+    child is resolved. `board` is moveseq_to_board49(moveseq); children derive
+    theirs from the parent's board with board49_play instead of re-encoding.
+
+    Runs as a loop over an explicit stack instead of recursing, so no Python
+    call frame is created per node. fr_*[sp] hold the state of the node at
+    stack depth sp while its children are searched (one list per field, sized
+    for the maximal depth); `moves` lists the children to visit, first move
+    first. A resolved node hands its value up through `ret`.
+    """
+    tt = TRANSPOSITION_TABLE
+    tt_buckets = tt.buckets
+    tt_nbuckets = tt.num_buckets
+
+    moveseq = bytearray(moveseq)
+    fr_board = [0] * (MAX_PLY + 1)
+    fr_alpha = [0] * (MAX_PLY + 1)
+    fr_beta = [0] * (MAX_PLY + 1)
+    fr_ub = [0] * (MAX_PLY + 1)
+    fr_value = [0] * (MAX_PLY + 1)
+    fr_moves: list[tuple[int, ...]] = [()] * (MAX_PLY + 1)
+    fr_k = [0] * (MAX_PLY + 1)
+    sp = -1
+
+    while True:
+        # checked once per node: the stores made since the last check can only
+        # overshoot grow_at by MAX_PLY + 1, far from filling the table
+        if tt.size > tt.grow_at:
+            tt.grow()
+            tt_buckets = tt.buckets
+            tt_nbuckets = tt.num_buckets
+
+        # enter the node (moveseq, board, alpha, beta)
+        ply = len(moveseq)
+        ret = None
+        lb = -1
+        ub = 1
+
+        tt_value = tt_get(tt_buckets, tt_nbuckets, board)
+        if tt_value != TT_MISS:
+            tt_value = int(tt_value)
+            lb = (tt_value % 16) - 1
+            ub = (tt_value // 16) - 1
+            if lb >= beta:
+                ret = lb
+            elif ub <= alpha:
+                ret = ub
+            elif beta - alpha > 1:
+                # a null window (beta == alpha + 1) that survived both tests
+                # already lies within [lb, ub]; only a wide one can narrow
+                alpha = max(alpha, lb)
+                beta = min(beta, ub)
+
+        if ret is None:
+            seq = bytes(moveseq)
+            is_terminal, present, values = srv.query(seq)
+
+            if is_terminal:
+                if ply == 42:
+                    # the parent's best WDL is already on the stack (fr_value);
+                    # only a search started at ply 42 has to ask for it
+                    if sp >= 0:
+                        parent_value = fr_value[sp]
+                    else:
+                        parent_value = wdl_max(srv.query(seq[:-1])[2])
+                    if parent_value == 1:
+                        value = -1
+                    else:
+                        value = 0
+                else:
+                    value = -1
+                tt.size += tt_set(
+                    tt_buckets, tt_nbuckets, board, (value + 1) + ((value + 1) * 16)
+                )  # store exact
+                ret = value
             else:
-                value = 0
-        else:
-            value = -1
-        TRANSPOSITION_TABLE.set(board, (value + 1) + ((value + 1) * 16))  # store exact
-        return value
-
-    value = max(x for x in wdl_list if x is not None)
-
-    if beta <= value:  # beta-cutoff will occur
-        for move in MOVE_ORDERING:
-            if wdl_list[move] == value:
-                next_moveseq = moveseq + str(move)
-                child_value = -search(next_moveseq, -beta, -alpha)
-                assert child_value == value
-                assert child_value >= beta
-                alpha = value
-                beta = value
-                break
-        TRANSPOSITION_TABLE.set(board, (value + 1) + ((ub + 1) * 16))
-    else:
-        for move in MOVE_ORDERING:
-            if wdl_list[move] == value:
-                first_move = move
-                next_moveseq = moveseq + str(move)
-                child_value = -search(next_moveseq, -alpha - 1, -alpha)
-                assert child_value == value
-                assert child_value < beta
-                alpha = max(alpha, value)
-                break
-        for move in MOVE_ORDERING:
-            if move == first_move:
+                value, moves = ORDERED_CHILDREN[(present << 14) | values]
+                first_move = moves[0]
+
+                if beta <= value:  # beta-cutoff will occur (only moves[0] is visited)
+                    child_alpha, child_beta = -beta, -alpha
+                else:
+                    # every legal child is visited below: let the server evaluate
+                    # them ahead of the descent (children answered from the TT
+                    # just leave a stale cache entry behind)
+                    srv.prefetch([seq + DIGIT_BYTES[move] for move in moves])
+                    child_alpha, child_beta = -alpha - 1, -alpha
+
+                sp += 1
+                fr_board[sp] = board
+                fr_alpha[sp] = alpha
+                fr_beta[sp] = beta
+                fr_ub[sp] = ub
+                fr_value[sp] = value
+                fr_moves[sp] = moves
+                fr_k[sp] = 0
+
+                # descend into the first child
+                board = board49_play(board, first_move, ply)
+                moveseq.append(48 + first_move)
+                alpha, beta = child_alpha, child_beta
                 continue
-            if wdl_list[move] is not None:
-                next_moveseq = moveseq + str(move)
-                child_value = -search(next_moveseq, -beta, -alpha)
-                assert child_value <= alpha
 
-        TRANSPOSITION_TABLE.set(board, (value + 1) + ((value + 1) * 16))
-    return value
+        # hand `ret` up until some node still has a child to visit
+        while sp >= 0:
+            moveseq.pop()
+            value = fr_value[sp]
+            alpha = fr_alpha[sp]
+            beta = fr_beta[sp]
+            k = fr_k[sp]
+
+            if beta <= value:  # the cutoff child
+                if DEBUG:
+                    assert -ret == value
+                    assert -ret >= beta
+                tt.size += tt_set(
+                    tt_buckets,
+                    tt_nbuckets,
+                    fr_board[sp],
+                    (value + 1) + ((fr_ub[sp] + 1) * 16),
+                )
+                ret = value
+                sp -= 1
+                continue
+
+            if k == 0:  # the first child
+                if DEBUG:
+                    assert -ret == value
+                    assert -ret < beta
+                # below a null window value <= alpha, so only a wide one can rise
+                if beta - alpha > 1:
+                    alpha = max(alpha, value)
+                    fr_alpha[sp] = alpha
+            elif DEBUG:
+                assert -ret <= alpha
+
+            k += 1
+            moves = fr_moves[sp]
+            if k < len(moves):
+                # descend into the next child
+                fr_k[sp] = k
+                move = moves[k]
+                board = board49_play(fr_board[sp], move, len(moveseq))
+                moveseq.append(48 + move)
+                alpha, beta = -beta, -alpha
+                break
+
+            tt.size += tt_set(
+                tt_buckets, tt_nbuckets, fr_board[sp], (value + 1) + ((value + 1) * 16)
+            )
+            ret = value
+            sp -= 1
+        else:
+            return ret
 
 
 if __name__ == "__main__":
     print(
         f"{datetime.datetime.now().strftime(r'%Y/%m/%d %H:%M:%S')} : info: starting search"
     )
-    value = search("", -1, 1)
+    value = search(b"", 0, -1, 1)
     print(
         f"{datetime.datetime.now().strftime(r'%Y/%m/%d %H:%M:%S')} : info: search completed. value = {value} , Transposition table size = {TRANSPOSITION_TABLE.size}"
     )
 
     srv.close()
 
-    node_count = [0] * 43
-
-    for i in range(len(TRANSPOSITION_TABLE.slots)):
-        e = TRANSPOSITION_TABLE.slots[i]
-        if e != 0:
-            kp = e & TT49x8RobinHood.KEY_MASK
-            board = kp - 1
-            board_str = board49_to_board42(board)
-
-            val = e >> TT49x8RobinHood.VAL_SHIFT
-            node_kind = val >> 8
-
-            node_count[sum(1 for c in board_str if c != ".")] += 1
+    TRANSPOSITION_TABLE.advise_sequential()
+    boards = (TRANSPOSITION_TABLE.entries() & _KEY_MASK) - np.uint64(1)
+    node_count = np.bincount(board49_depths(boards), minlength=43).tolist()
 
     print("Depth,NodeCount")
     for depth in range(43):